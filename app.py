@@ -1,20 +1,131 @@
 import os
+import json
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
-from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_pinecone import PineconeVectorStore
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pinecone import Pinecone
-import tempfile
+from pinecone.grpc import PineconeGRPC as Pinecone
+from embedder import SharedEmbeddings, embed_and_upsert
+from pdf_processing import chunk_id, load_and_split_all
 
 # Load environment variables
 load_dotenv()
 
-# ---------------- Streamlit UI ----------------
+# Must be the first Streamlit command; cached init below may show a spinner
 st.set_page_config(page_title="RAG Study Bot", page_icon="📚", layout="wide")
 
+# ---------------- Initialize Services ----------------
+INDEX_NAME = "rag-chatbot"
+
+# Ollama local API setup
+OLLAMA_API_URL = "http://localhost:11434/api/generate"
+OLLAMA_TAGS_URL = "http://localhost:11434/api/tags"
+# Preferred models, explicitly quantized tag first
+OLLAMA_MODELS = ["llama3.2:3b-instruct-q4_K_M", "llama3.2:latest", "gemma3:4b", "llama3.2", "llama2"]
+# Keep weights resident between questions instead of reloading after idle
+OLLAMA_KEEP_ALIVE = "30m"
+# The prompt is trimmed to fit this window; it stays fixed because Ollama
+# reloads the model whenever num_ctx changes
+OLLAMA_NUM_CTX = 1024
+OLLAMA_NUM_PREDICT = 256
+
+def find_ollama_model(session):
+    """Return the first preferred model that is installed in Ollama, or None"""
+    response = session.get(OLLAMA_TAGS_URL, timeout=5)
+    response.raise_for_status()
+    installed = {model["name"] for model in response.json().get("models", [])}
+    for model_name in OLLAMA_MODELS:
+        # Untagged names are listed by Ollama as "<name>:latest"
+        if model_name in installed or f"{model_name}:latest" in installed:
+            return model_name
+    return None
+
+@st.cache_resource
+def init_services():
+    """Initialize Pinecone, embeddings, vector store, and the Ollama HTTP session"""
+    pc = Pinecone(
+        api_key=os.environ["PINECONE_API_KEY"],
+        environment=os.environ["PINECONE_ENV"]  # ← make sure this matches your index
+    )
+    index = pc.Index(INDEX_NAME)
+    
+    embeddings = SharedEmbeddings()
+    vectorstore = PineconeVectorStore(index_name=INDEX_NAME, embedding=embeddings)
+    
+    # One pooled keep-alive session for all Ollama calls so the TCP connection is reused
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    
+    # Preload a model so the first question doesn't pay the load time
+    try:
+        model_name = find_ollama_model(session)
+        if model_name:
+            session.post(
+                OLLAMA_API_URL,
+                json={
+                    "model": model_name,
+                    "prompt": "",
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                    "options": {"num_ctx": OLLAMA_NUM_CTX}
+                },
+                timeout=(2, 120)
+            )
+    except requests.exceptions.RequestException:
+        pass  # Ollama not running yet; the query path reports it
+    
+    return pc, index, embeddings, vectorstore, session
+
+pc, index, embeddings, vectorstore, session = init_services()
+
+# ---------------- Helper Functions ----------------
+def process_uploaded_files(uploaded_files):
+    """Process uploaded PDF files and add to Pinecone"""
+    try:
+        # PDFs are parsed from memory, so only bytes cross the process boundary
+        items = [(uploaded_file.read(), uploaded_file.name) for uploaded_file in uploaded_files]
+        
+        # Load and split the PDFs in parallel
+        all_chunks = load_and_split_all(items)
+        
+        metas = [
+            {"text": chunk.page_content, "source": chunk.metadata.get("source", "unknown")}
+            for chunk in all_chunks
+        ]
+        # Content-hash IDs: no index stats lookup, safe for concurrent uploads
+        ids = [chunk_id(meta["text"], meta["source"]) for meta in metas]
+        
+        # Embed and upsert in overlapping blocks
+        embed_and_upsert(index, [meta["text"] for meta in metas], ids, metas)
+        
+        st.success(f"✅ Successfully added {len(all_chunks)} chunks from {len(uploaded_files)} file(s)!")
+        st.balloons()
+        
+        # New chunks may change the answer to previously asked questions
+        retrieve.clear()
+        
+    except Exception as e:
+        st.error(f"Error processing files: {str(e)}")
+
+@st.cache_data(ttl=600, show_spinner=False)
+def retrieve(query, k=6):
+    """Retrieve relevant chunks, cached so reruns with the same query skip re-embedding"""
+    retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": k})
+    return retriever.get_relevant_documents(query)
+
+def estimate_tokens(text):
+    """Rough token count for Llama-style tokenizers (~3 characters per token)"""
+    return len(text) // 3
+
+def get_database_stats():
+    """Get statistics about the Pinecone database"""
+    try:
+        stats = index.describe_index_stats()
+        return stats
+    except Exception as e:
+        return None
+
+# ---------------- Streamlit UI ----------------
 # Sidebar for file upload
 with st.sidebar:
     st.header("📤 Upload Documents")
@@ -43,91 +154,12 @@ tab1, tab2 = st.tabs(["💬 Ask Questions", "📊 Database Info"])
 with tab1:
     query = st.text_input("Enter your question:", key="query_input")
 
-# ---------------- Pinecone & LangChain ----------------
-pc = Pinecone(
-    api_key=os.environ["PINECONE_API_KEY"],
-    environment=os.environ["PINECONE_ENV"]  # ← make sure this matches your index
-)
-
-INDEX_NAME = "rag-chatbot"
-index = pc.Index(INDEX_NAME)
-
-embeddings = SentenceTransformerEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-vectorstore = PineconeVectorStore(index_name=INDEX_NAME, embedding=embeddings)
-retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 6})
-
-# Ollama local API setup
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
-
-# ---------------- Helper Functions ----------------
-def process_uploaded_files(uploaded_files):
-    """Process uploaded PDF files and add to Pinecone"""
-    try:
-        all_chunks = []
-        
-        for uploaded_file in uploaded_files:
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(uploaded_file.read())
-                tmp_path = tmp_file.name
-            
-            # Load PDF
-            loader = PyPDFLoader(tmp_path)
-            docs = loader.load()
-            
-            # Split into chunks
-            splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-            chunks = splitter.split_documents(docs)
-            
-            # Add source filename to metadata
-            for chunk in chunks:
-                chunk.metadata['source'] = uploaded_file.name
-            
-            all_chunks.extend(chunks)
-            
-            # Clean up temp file
-            os.unlink(tmp_path)
-        
-        # Get current vector count for unique IDs
-        stats = index.describe_index_stats()
-        current_count = stats.total_vector_count
-        
-        # Create embeddings and upsert to Pinecone
-        batch = []
-        for i, chunk in enumerate(all_chunks):
-            vec = embeddings.embed_query(chunk.page_content)
-            meta = {
-                "text": chunk.page_content,
-                "source": chunk.metadata.get("source", "unknown")
-            }
-            batch.append((f"id-{current_count + i}", vec, meta))
-            
-            if len(batch) >= 64:
-                index.upsert(vectors=batch)
-                batch = []
-        
-        if batch:
-            index.upsert(vectors=batch)
-        
-        st.success(f"✅ Successfully added {len(all_chunks)} chunks from {len(uploaded_files)} file(s)!")
-        st.balloons()
-        
-    except Exception as e:
-        st.error(f"Error processing files: {str(e)}")
-
-def get_database_stats():
-    """Get statistics about the Pinecone database"""
-    try:
-        stats = index.describe_index_stats()
-        return stats
-    except Exception as e:
-        return None
-
 # ---------------- Query & Display ----------------
     if query:
         with st.spinner("Searching your notes... 🔍"):
             # Retrieve relevant documents
-            docs = retriever.get_relevant_documents(query)
+            # Short questions need fewer MMR candidates; only the top 3 reach the prompt
+            docs = retrieve(query, k=4 if len(query.split()) <= 8 else 6)
             
             # Show what was retrieved
             st.info(f"📚 Found {len(docs)} relevant document chunks")
@@ -139,9 +171,13 @@ def get_database_stats():
             # Combine context from retrieved documents (limit to top 3)
             context = "\n\n".join([doc.page_content for doc in docs[:3]])
             
-            # Truncate context if too long
-            if len(context) > 2000:
-                context = context[:2000] + "..."
+            # Truncate context to the tokens left after the question, template and answer
+            context_budget = OLLAMA_NUM_CTX - OLLAMA_NUM_PREDICT - estimate_tokens(query) - 64
+            if estimate_tokens(context) > context_budget:
+                context = context[:max(context_budget, 0) * 3] + "..."
+            
+            # Answer is streamed into this slot token by token
+            answer_placeholder = st.empty()
             
             # Generate answer using Ollama
             try:
@@ -153,39 +189,53 @@ Question: {query}
 
 Answer:"""
                 
-                # Try different model name formats
-                models_to_try = ["llama3.2:latest", "gemma3:4b", "llama3.2", "llama2"]
+                # Look the model up once per session instead of probing names per question
+                if "ollama_model" not in st.session_state:
+                    model_name = find_ollama_model(session)
+                    if model_name:
+                        st.session_state["ollama_model"] = model_name
+                model_name = st.session_state.get("ollama_model")
                 
-                answer = None
-                for model_name in models_to_try:
+                if model_name is None:
+                    st.error(f"❌ None of these models found: {', '.join(OLLAMA_MODELS)}")
+                    st.info("Run `ollama list` in terminal to see available models")
+                    answer = "No compatible model found. Please check your Ollama installation."
+                else:
                     payload = {
                         "model": model_name,
                         "prompt": prompt,
-                        "stream": False,
+                        "stream": True,
+                        "keep_alive": OLLAMA_KEEP_ALIVE,
                         "options": {
                             "temperature": 0.5,
-                            "num_predict": 256,
-                            "num_ctx": 2048
+                            "num_predict": OLLAMA_NUM_PREDICT,
+                            "num_ctx": OLLAMA_NUM_CTX
                         }
                     }
                     
-                    response = requests.post(OLLAMA_API_URL, json=payload, timeout=120)
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        answer = result.get("response", "No answer generated.")
-                        st.success(f"✅ Using model: {model_name}")
-                        break
-                    elif response.status_code == 404:
-                        continue
-                    else:
-                        st.error(f"Ollama Error: {response.status_code}")
-                        break
-                
-                if answer is None:
-                    st.error(f"❌ None of these models found: {', '.join(models_to_try)}")
-                    st.info("Run `ollama list` in terminal to see available models")
-                    answer = "No compatible model found. Please check your Ollama installation."
+                    # (connect, per-chunk read) timeouts instead of one for the whole answer
+                    with session.post(OLLAMA_API_URL, json=payload, stream=True, timeout=(10, 60)) as response:
+                        if response.status_code == 200:
+                            st.success(f"✅ Using model: {model_name}")
+                            answer = ""
+                            # Ollama streams one JSON object per line and ends the stream
+                            # after the "done" object; reading it to the end lets the
+                            # connection go back to the keep-alive pool
+                            for line in response.iter_lines():
+                                if not line:
+                                    continue
+                                chunk = json.loads(line)
+                                if "error" in chunk:
+                                    st.error(f"Ollama Error: {chunk['error']}")
+                                    continue
+                                answer += chunk.get("response", "")
+                                answer_placeholder.markdown(f"**Answer:** {answer}")
+                            answer = answer or "No answer generated."
+                        else:
+                            # The model may have been removed; look it up again next time
+                            st.session_state.pop("ollama_model", None)
+                            st.error(f"Ollama Error: {response.status_code}")
+                            answer = "Unable to generate answer. Please check Ollama setup."
             except requests.exceptions.Timeout:
                 st.error("⏱️ Ollama took too long to respond.")
                 answer = "Request timed out. Consider using a smaller/faster model."
@@ -196,7 +246,7 @@ Answer:"""
                 st.error(f"Error: {str(e)}")
                 answer = "Unable to generate answer. Please check Ollama setup."
             
-        st.markdown(f"**Answer:** {answer}")
+        answer_placeholder.markdown(f"**Answer:** {answer}")
         
         # Show sources
         with st.expander("📄 View Sources"):
@@ -1,17 +1,18 @@
 import os
 import streamlit as st
 from dotenv import load_dotenv
-from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_pinecone import PineconeVectorStore
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pinecone import Pinecone
+from pinecone.grpc import PineconeGRPC as Pinecone
 from groq import Groq
-import tempfile
+from embedder import SharedEmbeddings, embed_and_upsert
+from pdf_processing import chunk_id, load_and_split_all
 
 # Load environment variables
 load_dotenv()
 
+# Must be the first Streamlit command; cached init below may show a spinner
+st.set_page_config(page_title="RAG Study Bot", page_icon="📚", layout="wide")
+
 # ---------------- Initialize Services ----------------
 @st.cache_resource
 def init_services():
@@ -21,7 +22,7 @@ def init_services():
         environment=os.environ["PINECONE_ENV"]
     )
     
-    embeddings = SentenceTransformerEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+    embeddings = SharedEmbeddings()
     client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
     
     return pc, embeddings, client
@@ -31,64 +32,42 @@ pc, embeddings, client = init_services()
 INDEX_NAME = "rag-chatbot"
 index = pc.Index(INDEX_NAME)
 vectorstore = PineconeVectorStore(index_name=INDEX_NAME, embedding=embeddings)
-retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 6})
 
 # ---------------- Helper Functions ----------------
 def process_uploaded_files(uploaded_files):
     """Process uploaded PDF files and add to Pinecone"""
     try:
-        all_chunks = []
-        
-        for uploaded_file in uploaded_files:
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(uploaded_file.read())
-                tmp_path = tmp_file.name
-            
-            # Load PDF
-            loader = PyPDFLoader(tmp_path)
-            docs = loader.load()
-            
-            # Split into chunks
-            splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-            chunks = splitter.split_documents(docs)
-            
-            # Add source filename to metadata
-            for chunk in chunks:
-                chunk.metadata['source'] = uploaded_file.name
-            
-            all_chunks.extend(chunks)
-            
-            # Clean up temp file
-            os.unlink(tmp_path)
+        # PDFs are parsed from memory, so only bytes cross the process boundary
+        items = [(uploaded_file.read(), uploaded_file.name) for uploaded_file in uploaded_files]
         
-        # Get current vector count for unique IDs
-        stats = index.describe_index_stats()
-        current_count = stats.total_vector_count
+        # Load and split the PDFs in parallel
+        all_chunks = load_and_split_all(items)
         
-        # Create embeddings and upsert to Pinecone
-        batch = []
-        for i, chunk in enumerate(all_chunks):
-            vec = embeddings.embed_query(chunk.page_content)
-            meta = {
-                "text": chunk.page_content,
-                "source": chunk.metadata.get("source", "unknown")
-            }
-            batch.append((f"id-{current_count + i}", vec, meta))
-            
-            if len(batch) >= 64:
-                index.upsert(vectors=batch)
-                batch = []
+        metas = [
+            {"text": chunk.page_content, "source": chunk.metadata.get("source", "unknown")}
+            for chunk in all_chunks
+        ]
+        # Content-hash IDs: no index stats lookup, safe for concurrent uploads
+        ids = [chunk_id(meta["text"], meta["source"]) for meta in metas]
         
-        if batch:
-            index.upsert(vectors=batch)
+        # Embed and upsert in overlapping blocks
+        embed_and_upsert(index, [meta["text"] for meta in metas], ids, metas)
         
         st.success(f"✅ Successfully added {len(all_chunks)} chunks from {len(uploaded_files)} file(s)!")
         st.balloons()
         
+        # New chunks may change the answer to previously asked questions
+        retrieve.clear()
+        
     except Exception as e:
         st.error(f"Error processing files: {str(e)}")
 
+@st.cache_data(ttl=600, show_spinner=False)
+def retrieve(query, k=6):
+    """Retrieve relevant chunks, cached so reruns with the same query skip re-embedding"""
+    retriever = vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": k})
+    return retriever.get_relevant_documents(query)
+
 def get_database_stats():
     """Get statistics about the Pinecone database"""
     try:
@@ -98,8 +77,6 @@ def get_database_stats():
         return None
 
 # ---------------- Streamlit UI ----------------
-st.set_page_config(page_title="RAG Study Bot", page_icon="📚", layout="wide")
-
 # Sidebar for file upload
 with st.sidebar:
     st.header("📤 Upload Documents")
@@ -128,7 +105,8 @@ with tab1:
     if query:
         with st.spinner("Searching your notes... 🔍"):
             # Retrieve relevant documents
-            docs = retriever.get_relevant_documents(query)
+            # Short questions need fewer MMR candidates; only the top 3 reach the prompt
+            docs = retrieve(query, k=4 if len(query.split()) <= 8 else 6)
             
             # Show what was retrieved
             st.info(f"📚 Found {len(docs)} relevant document chunks")
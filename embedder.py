@@ -0,0 +1,83 @@
+import os
+from collections import deque
+import torch
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+from tqdm.auto import tqdm
+
+# Shared embedding model: ingest.py and the Streamlit apps import this module
+# so only one copy of the weights is loaded per process
+load_dotenv()
+
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+EMBED_BATCH_SIZE = 64  # sentences per forward pass
+UPSERT_BATCH_SIZE = 100  # vectors per Pinecone request (recommended max)
+PIPELINE_BLOCK_SIZE = 200  # chunks embedded before their upserts are sent
+MAX_IN_FLIGHT = 8  # pending upsert requests before embedding waits
+
+# ONNX Runtime is noticeably faster than PyTorch on CPU; set
+# EMBED_BACKEND=torch to fall back to the plain PyTorch model
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "onnx")
+# e.g. "onnx/model_qint8_avx512_vnni.onnx" for the int8-quantized export
+EMBED_ONNX_FILE = os.environ.get("EMBED_ONNX_FILE")
+
+if torch.cuda.is_available():
+    # FP16 on GPU: half the memory traffic and tensor-core matmuls
+    sbert_kwargs = {"device": "cuda", "model_kwargs": {"torch_dtype": torch.float16}}
+else:
+    sbert_kwargs = {"backend": EMBED_BACKEND}
+    if EMBED_BACKEND == "onnx" and EMBED_ONNX_FILE:
+        sbert_kwargs["model_kwargs"] = {"file_name": EMBED_ONNX_FILE}
+
+sbert = SentenceTransformer(MODEL_NAME, **sbert_kwargs)
+
+def embed_texts(texts, show_progress_bar=False):
+    """Encode a list of texts in batches; returns a NumPy array of unit vectors"""
+    # Unit-length vectors let the index use dot product instead of cosine
+    return sbert.encode(
+        texts,
+        batch_size=EMBED_BATCH_SIZE,
+        show_progress_bar=show_progress_bar,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    )
+
+def embed_and_upsert(index, texts, ids, metas, show_progress_bar=False):
+    """Embed texts block by block, upserting each block while the next one encodes"""
+    # Upserts go out with async_req=True, so network time overlaps with the
+    # next block's forward passes; at most MAX_IN_FLIGHT requests are pending.
+    # Process shortest-first so each block (and each encode batch in it)
+    # holds similar-length chunks, as encode() would do for the full list
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    progress = tqdm(total=len(texts), disable=not show_progress_bar)
+    in_flight = deque()
+
+    for start in range(0, len(order), PIPELINE_BLOCK_SIZE):
+        block = order[start:start + PIPELINE_BLOCK_SIZE]
+        vecs = embed_texts([texts[i] for i in block])
+
+        for b in range(0, len(block), UPSERT_BATCH_SIZE):
+            # tolist() yields plain fp32-compatible floats even for FP16 output
+            batch = [
+                (ids[i], vec.tolist(), metas[i])
+                for i, vec in zip(block[b:b + UPSERT_BATCH_SIZE], vecs[b:b + UPSERT_BATCH_SIZE])
+            ]
+            in_flight.append(index.upsert(vectors=batch, async_req=True))
+
+        while len(in_flight) > MAX_IN_FLIGHT:
+            in_flight.popleft().result()
+        progress.update(len(block))
+
+    for future in in_flight:
+        future.result()
+    progress.close()
+
+class SharedEmbeddings(Embeddings):
+    """LangChain embeddings backed by the shared sbert model"""
+
+    def embed_documents(self, texts):
+        return embed_texts(texts).tolist()
+
+    def embed_query(self, text):
+        return embed_texts([text])[0].tolist()
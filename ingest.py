@@ -1,9 +1,10 @@
 import os
 from dotenv import load_dotenv
-from pinecone import Pinecone, ServerlessSpec
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+from pinecone import ServerlessSpec
+from pinecone.grpc import PineconeGRPC as Pinecone
+from langchain_community.document_loaders import PyMuPDFLoader
+from embedder import embed_and_upsert, embed_texts
+from pdf_processing import SPLITTER, chunk_id
 
 # Load environment variables
 load_dotenv()
@@ -17,24 +18,21 @@ for file_name in os.listdir(folder_path):
     if file_name.endswith(".pdf"):
         pdf_path = os.path.join(folder_path, file_name)
         print(f"📄 Loading {pdf_path}...")
-        loader = PyPDFLoader(pdf_path)
+        loader = PyMuPDFLoader(pdf_path)
         docs.extend(loader.load())
 
 # -------------------------------------------------------------------
 # 2) Chunk documents
 # -------------------------------------------------------------------
-splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-chunks = splitter.split_documents(docs)
+chunks = SPLITTER.split_documents(docs)
 
 # -------------------------------------------------------------------
 # 3) Embeddings
 # -------------------------------------------------------------------
-sbert = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-def embed_texts(texts):
-    return sbert.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+# The model lives in embedder.py and is shared with the Streamlit apps
 
 # -------------------------------------------------------------------
-# 4) Init Pinecone v3 client
+# 4) Init Pinecone gRPC client
 # -------------------------------------------------------------------
 pc = Pinecone(
     api_key=os.environ["PINECONE_API_KEY"],
@@ -47,28 +45,92 @@ if INDEX_NAME not in pc.list_indexes().names():
     pc.create_index(
         name=INDEX_NAME,
         dimension=768,
-        metric="cosine",
+        metric="dotproduct",  # embedder.py normalizes, so this equals cosine
         spec=ServerlessSpec(cloud="aws", region="us-east-1")  # adjust region if needed
     )
 
 index = pc.Index(INDEX_NAME)
 
 # -------------------------------------------------------------------
-# 5) Upsert embeddings
+# 5) Upsert embeddings (or bulk import when PINECONE_IMPORT_URI is set)
 # -------------------------------------------------------------------
-batch = []
-for i, doc in enumerate(chunks):
-    vec = embed_texts([doc.page_content])[0]
-    # Store the actual text content in metadata so it can be retrieved
-    meta = {
-        "text": doc.page_content,
-        "source": doc.metadata.get("source", "unknown")
-    }
-    batch.append((f"id-{i}", vec.tolist(), meta))
-    if len(batch) >= 64:
-        index.upsert(vectors=batch)
-        batch = []
-if batch:
-    index.upsert(vectors=batch)
+# Store the actual text content in metadata so it can be retrieved
+metas = [
+    {"text": doc.page_content, "source": doc.metadata.get("source", "unknown")}
+    for doc in chunks
+]
+# Content-hash IDs make re-running the script overwrite rather than duplicate
+ids = [chunk_id(meta["text"], meta["source"]) for meta in metas]
+
+# e.g. "s3://my-bucket/rag-chatbot/" -- Pinecone reads <uri>/<namespace>/*.parquet
+IMPORT_URI = os.environ.get("PINECONE_IMPORT_URI")
+
+if IMPORT_URI and not metas:
+    print("ℹ️ No chunks found in ./papers; skipping bulk import")
+    IMPORT_URI = None
+
+if IMPORT_URI:
+    # Bulk import can only fill a new namespace. Once the default namespace has
+    # vectors (an earlier run or app uploads), upsert instead so IDs overwrite
+    namespaces = index.describe_index_stats().namespaces
+    existing = sum(namespaces[ns].vector_count for ns in ("", "__default__") if ns in namespaces)
+    if existing:
+        print(f"ℹ️ Default namespace already holds {existing:,} vectors; upserting instead of bulk import")
+        IMPORT_URI = None
+
+if IMPORT_URI:
+    # Bulk import runs server-side, so large corpora skip per-batch requests
+    import json
+    import tempfile
+    import time
+    import boto3
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pinecone import Pinecone as PineconeHTTP  # imports are REST-only
+
+    # Encode every chunk in one call so the model runs full batches;
+    # encode() length-sorts a list input, which keeps padding per batch low
+    vecs = embed_texts([meta["text"] for meta in metas], show_progress_bar=True)
+
+    # Build the list<float> column straight from the array buffer instead of
+    # converting every vector to a Python list
+    flat = vecs.astype("float32").ravel()
+    offsets = np.arange(0, flat.size + 1, vecs.shape[1], dtype=np.int32)
+    table = pa.Table.from_pydict({
+        "id": ids,
+        "values": pa.ListArray.from_arrays(offsets, flat),
+        "metadata": [json.dumps(meta) for meta in metas]
+    })
+
+    bucket, _, prefix = IMPORT_URI.removeprefix("s3://").partition("/")
+    key = "/".join(p for p in (prefix.strip("/"), "__default__", "chunks.parquet") if p)
+
+    # Stage the corpus-sized file in a temp dir that is removed after upload
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parquet_path = os.path.join(tmp_dir, "chunks.parquet")
+        pq.write_table(table, parquet_path)
+        print(f"☁️ Uploading chunks.parquet to s3://{bucket}/{key}...")
+        boto3.client("s3").upload_file(parquet_path, bucket, key)
+
+    import_index = PineconeHTTP(api_key=os.environ["PINECONE_API_KEY"]).Index(INDEX_NAME)
+    job = import_index.start_import(
+        uri=IMPORT_URI,
+        integration_id=os.environ.get("PINECONE_INTEGRATION_ID"),
+        # Fail the whole job on a bad record instead of silently skipping it
+        error_mode="ABORT"
+    )
+    while True:
+        status = import_index.describe_import(id=job.id).status
+        if status in ("Completed", "Failed", "Cancelled"):
+            break
+        print(f"⏳ Import {job.id}: {status}")
+        time.sleep(10)
+
+    if status != "Completed":
+        raise SystemExit(f"❌ Import {job.id} finished with status {status}")
+else:
+    # Embedding of the next block overlaps with the upserts of the previous one
+    embed_and_upsert(index, [meta["text"] for meta in metas], ids, metas, show_progress_bar=True)
 
 print(f"✅ Uploaded {len(chunks)} chunks to Pinecone index '{INDEX_NAME}'")
@@ -0,0 +1,57 @@
+import os
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+import fitz  # PyMuPDF
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# PDF loading and chunking for the Streamlit uploaders. Kept in its own module
+# (no model or Streamlit imports) so pool workers can import it cheaply
+
+# Built once per process; pool workers construct their own on import rather
+# than having the object pickled across
+SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=800,
+    chunk_overlap=150,
+    length_function=len,
+    is_separator_regex=False
+)
+
+def load_and_split(bytes_and_name):
+    """Parse one in-memory PDF and split it into chunks tagged with its source name"""
+    pdf_bytes, name = bytes_and_name
+
+    # Load PDF straight from the uploaded bytes, no temp file
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf:
+        docs = [
+            Document(page_content=page.get_text("text"), metadata={"page": i})
+            for i, page in enumerate(pdf)
+        ]
+
+    # Split into chunks
+    chunks = SPLITTER.split_documents(docs)
+
+    # Add source filename to metadata
+    for chunk in chunks:
+        chunk.metadata['source'] = name
+
+    return chunks
+
+def load_and_split_all(items):
+    """Load and split several (bytes, name) PDFs, one process per CPU"""
+    # A single file isn't worth the cost of starting worker processes
+    if len(items) <= 1:
+        return list(chain.from_iterable(map(load_and_split, items)))
+
+    # Spawn fresh workers: forking the threaded Streamlit server would copy
+    # its gRPC channel and ONNX Runtime threads, which isn't fork-safe
+    max_workers = min(len(items), os.cpu_count() or 1)
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as pool:
+        return list(chain.from_iterable(pool.map(load_and_split, items)))
+
+def chunk_id(text, source):
+    """Stable vector ID from a chunk's source and text, so re-uploads overwrite instead of duplicating"""
+    return hashlib.sha1(f"{source}\n{text}".encode()).hexdigest()[:16]